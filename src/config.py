@@ -1,59 +1,71 @@
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Optional, Tuple
 import os
+import threading
 import yaml
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as _YamlLoader
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class FramePreprocessingConfig:
-    crop: Optional[List[int]] = None  # [x, y, width, height]
-    resize: Optional[List[int]] = None  # [width, height]
+    crop: Optional[Tuple[int, int, int, int]] = None  # (x, y, width, height), negatives clamped to 0
+    resize: Optional[Tuple[int, int]] = None  # (width, height)
     rotate_deg: Optional[int] = None  # rotation in degrees (applied after crop/resize)
+    crop_slice: Optional[Tuple[slice, slice]] = field(default=None, repr=False)  # frame[crop_slice]; None if empty
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DatasetConfig:
     root: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class EpisodesConfig:
-    start_id: Optional[str] = None
-    end_id: Optional[str] = None
+    start_id: Optional[int] = None
+    end_id: Optional[int] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CamerasConfig:
-    targets: List[str]
+    targets: Tuple[str, ...]
     preprocessing: Dict[str, FramePreprocessingConfig] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ProcessingConfig:
     target_fps: float = 1.0
     debug_keep_video: bool = False
     debug_dir: str = "./debug_videos"
     workers: int = 1
+    gemini_workers: Optional[int] = None  # concurrent Gemini calls; defaults to workers
+    balance_by_size: bool = False  # start the largest episodes first so no long one runs last
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class GeminiConfig:
     model_name: str
+    batch_size: int = 0  # >0 sends episodes in Batch API jobs of this size (cheaper, slower)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class OutputConfig:
     dir: str
     filename_pattern: str
+    always_persist_raw: bool = False
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class PromptConfig:
     base_system_prompt: str
     dataset_specific_context: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class PipelineConfig:
     dataset: DatasetConfig
     episodes: EpisodesConfig
@@ -67,17 +79,55 @@ class PipelineConfig:
 def _build_frame_preprocessing(raw_cfg: Dict[str, Dict]) -> Dict[str, FramePreprocessingConfig]:
     result: Dict[str, FramePreprocessingConfig] = {}
     for camera, cfg in (raw_cfg or {}).items():
+        crop = None
+        crop_slice = None
+        if cfg.get("crop"):
+            x, y, w, h = (max(int(v), 0) for v in cfg["crop"])
+            crop = (x, y, w, h)
+            if w > 0 and h > 0:
+                crop_slice = (slice(y, y + h), slice(x, x + w))
+        resize = None
+        if cfg.get("resize"):
+            width, height = cfg["resize"]
+            resize = (int(width), int(height))
         result[camera] = FramePreprocessingConfig(
-            crop=cfg.get("crop"),
-            resize=cfg.get("resize"),
+            crop=crop,
+            resize=resize,
             rotate_deg=cfg.get("rotate_deg"),
+            crop_slice=crop_slice,
         )
     return result
 
 
+# Parsed configs keyed by (abspath, mtime_ns, size); editing a file changes its key.
+_CACHE_MAX_ENTRIES = 100
+_CACHE: "OrderedDict[Tuple[str, str, int, int], object]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def _cached_load(kind: str, path: str, parse: Callable[[str], object]):
+    st = os.stat(path)
+    key = (kind, os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+        if cached is not None:
+            _CACHE.move_to_end(key)
+    if cached is None:
+        cached = parse(path)
+        with _CACHE_LOCK:
+            _CACHE[key] = cached
+            while len(_CACHE) > _CACHE_MAX_ENTRIES:
+                _CACHE.popitem(last=False)
+    return cached
+
+
 def load_config(path: str) -> PipelineConfig:
+    return _cached_load("pipeline", path, _parse_config)
+
+
+def _parse_config(path: str) -> PipelineConfig:
     with open(path, "r") as f:
-        raw = yaml.safe_load(f)
+        raw = yaml.load(f, Loader=_YamlLoader)
 
     if not raw:
         raise ValueError("Configuration file is empty.")
@@ -86,11 +136,11 @@ def load_config(path: str) -> PipelineConfig:
     def _normalize_episode_id(value):
         if value is None:
             return None
+        if isinstance(value, str) and value.isdecimal():
+            return int(value)
         if isinstance(value, int):
-            return f"{value:06d}"
-        if isinstance(value, str):
-            return value.zfill(6) if value.isdigit() else value
-        raise ValueError(f"episodes IDs must be str or int, got {type(value)}")
+            return value
+        raise ValueError(f"episodes IDs must be an int or a string of digits, got {value!r}")
 
     episodes_cfg = EpisodesConfig(
         start_id=_normalize_episode_id(raw.get("episodes", {}).get("start_id")),
@@ -100,7 +150,7 @@ def load_config(path: str) -> PipelineConfig:
     if "targets" not in cameras_raw or not cameras_raw["targets"]:
         raise ValueError("cameras.targets must list at least one camera.")
     cameras_cfg = CamerasConfig(
-        targets=cameras_raw["targets"],
+        targets=tuple(cameras_raw["targets"]),
         preprocessing=_build_frame_preprocessing(cameras_raw.get("preprocessing", {})),
     )
     processing_raw = raw.get("processing", {})
@@ -109,14 +159,22 @@ def load_config(path: str) -> PipelineConfig:
         debug_keep_video=processing_raw.get("debug_keep_video", False),
         debug_dir=processing_raw.get("debug_dir", "./debug_videos"),
         workers=int(processing_raw.get("workers", 1)),
+        gemini_workers=(
+            int(processing_raw["gemini_workers"]) if processing_raw.get("gemini_workers") is not None else None
+        ),
+        balance_by_size=bool(processing_raw.get("balance_by_size", False)),
+    )
+    gemini_cfg = GeminiConfig(
+        model_name=raw["gemini"]["model_name"],
+        batch_size=int(raw["gemini"].get("batch_size") or 0),
     )
-    gemini_cfg = GeminiConfig(model_name=raw["gemini"]["model_name"])
     output_raw = raw["output"]
     if "{episode_id}" not in output_raw["filename_pattern"]:
         raise ValueError("output.filename_pattern must include '{episode_id}'.")
     output_cfg = OutputConfig(
         dir=output_raw["dir"],
         filename_pattern=output_raw["filename_pattern"],
+        always_persist_raw=bool(output_raw.get("always_persist_raw", False)),
     )
     prompt_path = raw.get("prompt_path", "./config/prompt.yaml")
 
@@ -134,8 +192,12 @@ def load_config(path: str) -> PipelineConfig:
 def load_prompt_config(path: str) -> PromptConfig:
     if not os.path.exists(path):
         raise FileNotFoundError(f"Prompt file not found: {path}")
+    return _cached_load("prompt", path, _parse_prompt_config)
+
+
+def _parse_prompt_config(path: str) -> PromptConfig:
     with open(path, "r") as f:
-        raw = yaml.safe_load(f)
+        raw = yaml.load(f, Loader=_YamlLoader)
     return PromptConfig(
         base_system_prompt=raw.get("base_system_prompt", "").strip(),
         dataset_specific_context=raw.get("dataset_specific_context", "").strip(),
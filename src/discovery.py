@@ -0,0 +1,75 @@
+"""
+Episode discovery: walks <dataset_root>/videos/chunk-*/<camera>/episode_<id>.mp4.
+"""
+
+import os
+from collections import Counter
+from typing import Iterable, Iterator, List, Tuple
+
+from config import CamerasConfig, EpisodesConfig
+
+
+def _within_range(episode_number: int, episodes_cfg: EpisodesConfig) -> bool:
+    start_ok = episodes_cfg.start_id is None or episode_number >= episodes_cfg.start_id
+    end_ok = episodes_cfg.end_id is None or episode_number <= episodes_cfg.end_id
+    return start_ok and end_ok
+
+
+def discover_episodes(
+    dataset_root: str, cameras_cfg: CamerasConfig, episodes_cfg: EpisodesConfig
+) -> Iterator[Tuple[str, str]]:
+    """Yield (chunk_id, episode_id) chunk by chunk, so large datasets are never listed in full."""
+    videos_root = os.path.join(dataset_root, "videos")
+    try:
+        with os.scandir(videos_root) as entries:
+            chunk_dirs = sorted(
+                (entry.name, entry.path) for entry in entries if entry.name.startswith("chunk-") and entry.is_dir()
+            )
+    except FileNotFoundError:
+        return
+
+    for chunk_id, chunk_path in chunk_dirs:
+        # An episode is usable once every camera directory has a video for it.
+        camera_hits: Counter = Counter()
+        for camera in cameras_cfg.targets:
+            camera_dir = os.path.join(chunk_path, camera)
+            try:
+                with os.scandir(camera_dir) as entries:
+                    # episode_<digits>.mp4 -> "<digits>"
+                    camera_hits.update(
+                        name[8:-4]
+                        for entry in entries
+                        if (name := entry.name).startswith("episode_")
+                        and name.endswith(".mp4")
+                        and name[8:-4].isdecimal()
+                    )
+            except (FileNotFoundError, NotADirectoryError):
+                print(f"[WARN] Camera directory missing: {camera_dir}")
+
+        camera_count = len(cameras_cfg.targets)
+        candidates = [i for i, hits in camera_hits.items() if hits == camera_count]
+        for episode_number, episode_id in sorted((int(i), i) for i in candidates):
+            if _within_range(episode_number, episodes_cfg):
+                yield chunk_id, episode_id
+
+
+def largest_first(
+    episodes: Iterable[Tuple[str, str]], dataset_root: str, camera: str
+) -> List[Tuple[str, str]]:
+    """
+    Order episodes by the size of ``camera``'s video, largest first (longest-processing-time scheduling).
+    Materialises the episode list, trading streaming discovery for a shorter tail.
+    """
+    videos_root = os.path.join(dataset_root, "videos")
+    sized = []
+    for chunk_id, episode_id in episodes:
+        video_path = os.path.join(videos_root, chunk_id, camera, f"episode_{episode_id}.mp4")
+        try:
+            size = os.stat(video_path).st_size
+        except OSError as exc:
+            # Leave it to preprocessing to report the missing video; just schedule it last.
+            print(f"[WARN] Could not stat {video_path}: {exc}")
+            size = 0
+        sized.append((size, chunk_id, episode_id))
+    sized.sort(key=lambda item: item[0], reverse=True)
+    return [(chunk_id, episode_id) for _, chunk_id, episode_id in sized]
@@ -1,6 +1,13 @@
+import asyncio
+import contextlib
+import fcntl
+import functools
+import hashlib
+import json
 import os
+import threading
 import time
-from typing import Optional
+from typing import Dict, List, Optional, Tuple, Union
 
 from google import genai
 from google.genai import types
@@ -36,8 +43,7 @@ OUTPUT FORMAT:
 """.strip()
 
 
-def build_prompt(prompt_cfg: PromptConfig, max_frame_count: Optional[int]) -> str:
-    schema_prompt = """
+SCHEMA_PROMPT = """
 Expected JSON schema:
 {
   "overall_summary": "Short natural language summary of the entire episode.",
@@ -60,47 +66,233 @@ Rules:
 - Prefer non-empty segments; include failures or idle periods as explicit segments.
 """.strip()
 
-    frame_note = ""
-    if max_frame_count:
-        frame_note = f"\nMax valid frame index for this episode: {max_frame_count}."
 
+@functools.lru_cache(maxsize=32)
+def _prompt_body(base_system_prompt: str, dataset_specific_context: str) -> str:
     parts = [
         RULE_PROMPT,
-        prompt_cfg.base_system_prompt,
+        base_system_prompt,
         "DATASET CONTEXT:",
-        prompt_cfg.dataset_specific_context,
-        schema_prompt + frame_note,
+        dataset_specific_context,
+        SCHEMA_PROMPT,
     ]
     return "\n\n".join(part.strip() for part in parts if part)
 
 
+@functools.lru_cache(maxsize=256)
+def _render_prompt(base_system_prompt: str, dataset_specific_context: str, max_frame_count: Optional[int]) -> str:
+    prompt = _prompt_body(base_system_prompt, dataset_specific_context)
+    if max_frame_count:
+        prompt += f"\nMax valid frame index for this episode: {max_frame_count}."
+    return prompt
+
+
+def build_prompt(prompt_cfg: PromptConfig, max_frame_count: Optional[int]) -> str:
+    # Only the frame note varies per episode, and sampled episodes share a handful of frame counts,
+    # so whole prompts are cached by content.
+    return _render_prompt(prompt_cfg.base_system_prompt, prompt_cfg.dataset_specific_context, max_frame_count)
+
+
+UPLOAD_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "gemini_uploads.json")
+# Uploaded files live for 48h; stop reusing them well before they expire mid-request.
+_UPLOAD_DEFAULT_TTL_S = 47 * 3600
+_UPLOAD_EXPIRY_MARGIN_S = 3600
+_POLL_INITIAL_S = 1.0
+_POLL_MAX_S = 10.0
+# Batch jobs queue for minutes to hours, so they are polled far less eagerly than uploads.
+_BATCH_POLL_INITIAL_S = 15.0
+_BATCH_POLL_MAX_S = 120.0
+_BATCH_DONE_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_PARTIALLY_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+}
+# Transient API errors (rate limits, overload) are retried by the SDK with exponential backoff.
+_RETRY_OPTIONS = types.HttpRetryOptions(
+    attempts=5,
+    initial_delay=2.0,
+    max_delay=60.0,
+    http_status_codes=[408, 429, 500, 502, 503, 504],
+)
+
+
+def _poll_delays(initial: float = _POLL_INITIAL_S, maximum: float = _POLL_MAX_S):
+    """Polling intervals doubling from ``initial`` up to ``maximum`` (uploads: 1s, 2s, 4s, ... 10s)."""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * 2, maximum)
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadCache:
+    """
+    On-disk map from video content hash to an uploaded Gemini file (name, uri, mime, expiry).
+    Safe to share between threads and between concurrent pipeline processes.
+    """
+
+    def __init__(self, path: str = UPLOAD_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[Dict]:
+        with self._locked():
+            entry = self._read().get(digest)
+        if entry and entry["expires"] - _UPLOAD_EXPIRY_MARGIN_S > time.time():
+            return entry
+        return None
+
+    def put(self, digest: str, entry: Dict) -> None:
+        with self._locked():
+            now = time.time()
+            entries = {key: value for key, value in self._read().items() if value["expires"] > now}
+            entries[digest] = entry
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock, open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+
 class GeminiInferenceClient:
-    def __init__(self, model_name: str, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        model_name: str,
+        api_key: Optional[str] = None,
+        upload_cache: Optional[UploadCache] = None,
+    ):
         self.model_name = model_name
         self.api_key = api_key or os.environ.get("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY is required to call the Gemini API.")
-        self.client = genai.Client(api_key=self.api_key)
+        self.client = genai.Client(
+            api_key=self.api_key,
+            http_options=types.HttpOptions(retry_options=_RETRY_OPTIONS),
+        )
+        self.upload_cache = upload_cache or UploadCache()
+
+    def _remember_upload(self, digest: str, video_file) -> None:
+        if video_file.state.name != "ACTIVE":
+            return
+        expires = time.time() + _UPLOAD_DEFAULT_TTL_S
+        if video_file.expiration_time is not None:
+            expires = video_file.expiration_time.timestamp()
+        self.upload_cache.put(
+            digest,
+            {"name": video_file.name, "uri": video_file.uri, "mime_type": video_file.mime_type, "expires": expires},
+        )
+
+    async def _reuse_upload_async(self, digest: str):
+        try:
+            entry = await asyncio.to_thread(self.upload_cache.get, digest)
+        except OSError as exc:
+            print(f"[WARN] Upload cache unavailable ({exc}); uploading without it.")
+            return None
+        if entry is None:
+            return None
+        try:
+            video_file = await self.client.aio.files.get(name=entry["name"])
+        except Exception:
+            return None
+        return video_file if video_file.state.name == "ACTIVE" else None
+
+    @staticmethod
+    def _build_contents(video_file, prompt_text: str):
+        return [
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part.from_uri(file_uri=video_file.uri, mime_type=video_file.mime_type),
+                    types.Part.from_text(text=prompt_text),
+                ],
+            )
+        ]
 
-    def analyze_episode(self, video_path: str, prompt_text: str) -> str:
+    async def _upload_async(self, video_path: str):
+        # Retries and prompt-only reruns reuse the earlier upload of an identical video.
+        digest = await asyncio.to_thread(_sha256_file, video_path)
+        video_file = await self._reuse_upload_async(digest)
+        if video_file is None:
+            video_file = await self.client.aio.files.upload(file=video_path)
+            delays = _poll_delays()
+            while video_file.state.name == "PROCESSING":
+                await asyncio.sleep(next(delays))
+                video_file = await self.client.aio.files.get(name=video_file.name)
+            try:
+                await asyncio.to_thread(self._remember_upload, digest, video_file)
+            except OSError as exc:
+                print(f"[WARN] Could not record upload in cache: {exc}")
+        return video_file
+
+    async def analyze_episode_async(self, video_path: str, prompt_text: str) -> str:
+        """Upload (or reuse) the video and run the prompt on it; upload polling yields to the event loop."""
         start_time = time.time()
-        video_file = self.client.files.upload(file=video_path)
-        while video_file.state.name == "PROCESSING":
-            time.sleep(1.0)
-            video_file = self.client.files.get(name=video_file.name)
+        video_file = await self._upload_async(video_path)
 
-        response = self.client.models.generate_content(
+        response = await self.client.aio.models.generate_content(
             model=self.model_name,
-            contents=[
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_uri(file_uri=video_file.uri, mime_type=video_file.mime_type),
-                        types.Part.from_text(text=prompt_text),
-                    ],
-                )
-            ],
+            contents=self._build_contents(video_file, prompt_text),
         )
         duration = time.time() - start_time
         print(f"[INFO] Gemini call completed in {duration:.2f}s for {video_path}")
         return response.text
+
+    async def analyze_batch_async(self, requests: List[Tuple[str, str]]) -> List[Union[str, Exception]]:
+        """
+        Label several (video_path, prompt_text) requests with one Batch API job: half the cost of
+        per-episode calls, but the job may queue for minutes to hours before it runs.
+        Returns, in request order, each response text or the error for that request.
+        """
+        start_time = time.time()
+        video_files = await asyncio.gather(*(self._upload_async(video_path) for video_path, _ in requests))
+        job = await self.client.aio.batches.create(
+            model=self.model_name,
+            src=[
+                types.InlinedRequest(contents=self._build_contents(video_file, prompt_text))
+                for video_file, (_, prompt_text) in zip(video_files, requests)
+            ],
+        )
+        delays = _poll_delays(_BATCH_POLL_INITIAL_S, _BATCH_POLL_MAX_S)
+        while job.state.name not in _BATCH_DONE_STATES:
+            await asyncio.sleep(next(delays))
+            job = await self.client.aio.batches.get(name=job.name)
+        if job.state.name not in ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"):
+            message = job.error.message if job.error else "no details"
+            raise RuntimeError(f"Batch job {job.name} ended in {job.state.name}: {message}")
+
+        inlined = job.dest.inlined_responses if job.dest else None
+        if not inlined or len(inlined) != len(requests):
+            raise RuntimeError(f"Batch job {job.name} returned {len(inlined or [])} responses for {len(requests)} requests.")
+        outputs: List[Union[str, Exception]] = []
+        for item in inlined:
+            if item.error is not None:
+                outputs.append(RuntimeError(f"Batch request failed ({item.error.code}): {item.error.message}"))
+            elif item.response is None:
+                outputs.append(RuntimeError("Batch request returned no response."))
+            else:
+                outputs.append(item.response.text)
+        duration = time.time() - start_time
+        print(f"[INFO] Gemini batch of {len(requests)} completed in {duration:.2f}s ({job.name})")
+        return outputs
@@ -36,7 +36,6 @@ USAGE:
 import cv2
 import time
 import os
-import re
 from google import genai
 from google.genai import types
 
@@ -176,15 +175,45 @@ OUTPUT FORMAT (JSON):
     
     return response.text
 
+def find_json_list_span(text):
+    """
+    Returns (start, end) of the widest balanced top-level [...] block, or None.
+    Tracks bracket depth in one pass and ignores brackets inside string literals.
+    """
+    best = None
+    depth = 0
+    start = 0
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '[':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif depth and ch == '"':
+            in_string = True
+        elif depth and ch == ']':
+            depth -= 1
+            if depth == 0 and (best is None or i + 1 - start > best[1] - best[0]):
+                best = (start, i + 1)
+    return best
+
 def extract_json_from_response(raw_response):
     """
     Cleans API response to extract strictly the JSON list part.
     Removes Markdown fences or conversational filler text.
     """
-    match = re.search(r'\[.*\]', raw_response, re.DOTALL)
-    if match:
+    span = find_json_list_span(raw_response)
+    if span:
         # Successfully extracted JSON from response
-        return match.group(0)
+        return raw_response[span[0]:span[1]]
     else:
         print("Warning: No JSON list found. Saving raw text.")
         return raw_response
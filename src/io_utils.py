@@ -1,20 +1,59 @@
+import gzip
 import json
 import os
-from typing import Dict
+import threading
+from typing import Dict, Set
+
+try:
+    import orjson
+except ImportError:  # optional: pip install ".[speedups]"
+    orjson = None
+
+
+def _dumps(payload: Dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    # Same compact UTF-8 output as orjson.
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+_ENSURED_DIRS: Set[str] = set()
+_ENSURED_DIRS_LOCK = threading.Lock()
+
+
+def _ensure_dir(path: str) -> None:
+    """os.makedirs once per directory per run; every episode writes into the same output dir."""
+    if path in _ENSURED_DIRS:
+        return
+    with _ENSURED_DIRS_LOCK:
+        if path not in _ENSURED_DIRS:
+            os.makedirs(path, exist_ok=True)
+            _ENSURED_DIRS.add(path)
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    """Write ``data`` to a temp file and rename it over ``path``, so readers never see a partial file."""
+    tmp_path = path + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
 
 
 def write_episode_output(output_cfg, episode_id: str, payload: Dict) -> str:
-    os.makedirs(output_cfg.dir, exist_ok=True)
+    _ensure_dir(output_cfg.dir)
     filename = output_cfg.filename_pattern.format(episode_id=episode_id)
     path = os.path.join(output_cfg.dir, filename)
-    with open(path, "w") as f:
-        json.dump(payload, f, ensure_ascii=True)
+    _write_bytes(path, _dumps(payload))
     return path
 
 
 def persist_raw(output_dir: str, episode_id: str, raw_text: str):
-    os.makedirs(output_dir, exist_ok=True)
-    path = os.path.join(output_dir, f"episode_{episode_id}_raw.txt")
-    with open(path, "w") as f:
-        f.write(raw_text)
+    _ensure_dir(output_dir)
+    path = os.path.join(output_dir, f"episode_{episode_id}_raw.txt.gz")
+    _write_bytes(path, gzip.compress(raw_text.encode("utf-8"), compresslevel=1))
     return path
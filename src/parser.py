@@ -3,6 +3,9 @@ import re
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
+_OBJECT_TOKEN_RE = re.compile(r'[{}"]')
+_JSON_STRING_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', flags=re.DOTALL)
+
 
 @dataclass
 class ParsedEpisode:
@@ -12,19 +15,54 @@ class ParsedEpisode:
     raw_text: str
 
 
-def _extract_json_object(raw_text: str) -> Optional[str]:
+def _scan_json_object(text: str) -> Optional[Tuple[int, int]]:
+    """
+    Return the (start, end) of the widest balanced top-level {...} block in ``text``.
+    Single left-to-right pass; braces inside JSON string literals are skipped.
+    """
+    best: Optional[Tuple[int, int]] = None
+    depth = 0
+    start = 0
+    token = _OBJECT_TOKEN_RE.search(text)
+    while token:
+        pos = token.end()
+        char = token.group()
+        if char == "{":
+            if depth == 0:
+                start = token.start()
+            depth += 1
+        elif depth:
+            if char == '"':
+                literal = _JSON_STRING_RE.match(text, token.start())
+                if literal is None:
+                    # Unterminated string: nothing after it can close the block.
+                    break
+                pos = literal.end()
+            else:
+                depth -= 1
+                if depth == 0 and (best is None or pos - start > best[1] - best[0]):
+                    best = (start, pos)
+        token = _OBJECT_TOKEN_RE.search(text, pos)
+    return best
+
+
+def _load_bare_object(raw_text: str) -> Optional[Dict[str, Any]]:
+    """Parse ``raw_text`` as-is when it is a bare JSON object; None for anything else."""
+    # Narrated responses cannot parse; skip the attempt (and its exception) for them.
+    if not raw_text.lstrip().startswith("{"):
+        return None
     try:
-        json.loads(raw_text)
-        return raw_text
+        payload = json.loads(raw_text)
     except json.JSONDecodeError:
-        pass
+        return None
+    return payload if isinstance(payload, dict) else None
 
-    matches = list(re.finditer(r"\{.*\}", raw_text, flags=re.DOTALL))
-    if not matches:
+
+def _extract_json_object(raw_text: str) -> Optional[str]:
+    span = _scan_json_object(raw_text)
+    if span is None:
         return None
-    # Pick the longest JSON-looking block.
-    match = max(matches, key=lambda m: len(m.group(0)))
-    return match.group(0)
+    return raw_text[span[0] : span[1]]
 
 
 def _coerce_int(value, field_name: str, warnings: List[str]) -> Optional[int]:
@@ -118,16 +156,19 @@ def parse_gemini_response(
     warnings: List[str] = []
     errors: List[str] = []
 
-    json_block = _extract_json_object(raw_text)
-    if not json_block:
-        errors.append("No JSON object found in model response.")
-        return ParsedEpisode(None, warnings, errors, raw_text)
-
-    try:
-        payload = json.loads(json_block)
-    except json.JSONDecodeError as exc:
-        errors.append(f"Failed to parse JSON: {exc}")
-        return ParsedEpisode(None, warnings, errors, raw_text)
+    # A bare JSON reply is parsed once here instead of being validated and then re-parsed.
+    payload = _load_bare_object(raw_text)
+    if payload is None:
+        json_block = _extract_json_object(raw_text)
+        if not json_block:
+            errors.append("No JSON object found in model response.")
+            return ParsedEpisode(None, warnings, errors, raw_text)
+
+        try:
+            payload = json.loads(json_block)
+        except json.JSONDecodeError as exc:
+            errors.append(f"Failed to parse JSON: {exc}")
+            return ParsedEpisode(None, warnings, errors, raw_text)
 
     episode, payload_warnings, payload_errors = validate_episode_payload(
         episode_id=episode_id,
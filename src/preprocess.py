@@ -1,7 +1,11 @@
+import concurrent.futures
+import contextlib
+import functools
 import os
 import shutil
+import subprocess
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
@@ -9,6 +13,95 @@ import numpy as np
 from config import CamerasConfig, FramePreprocessingConfig, ProcessingConfig
 
 
+# Keyed by rotate_deg % 360, so -90 arrives here as 270.
+_ROTATE_FLAGS = {
+    0: None,
+    90: cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+}
+
+
+# Tried in order; NVENC only works when the container sees a GPU.
+_FFMPEG_ENCODERS: Dict[str, List[str]] = {
+    "h264_nvenc": ["-preset", "p1"],
+    "libx264": ["-preset", "ultrafast"],
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _select_encoder() -> Optional[str]:
+    """Return the first ffmpeg encoder that can actually encode here, or None without ffmpeg."""
+    if shutil.which("ffmpeg") is None:
+        return None
+    for encoder in _FFMPEG_ENCODERS:
+        probe = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "color=c=black:s=256x256",
+            "-frames:v", "1", "-c:v", encoder, "-f", "null", "-",
+        ]
+        try:
+            result = subprocess.run(probe, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        if result.returncode == 0:
+            return encoder
+    return None
+
+
+class VideoSink:
+    """
+    Writes BGR frames to an H.264 mp4 by piping raw video into ffmpeg.
+    Uses h264_nvenc when available, libx264 otherwise, and cv2's mp4v writer without ffmpeg.
+    """
+
+    def __init__(self, path: str, width: int, height: int, fps: float):
+        self.path = path
+        self._proc: Optional[subprocess.Popen] = None
+        self._writer = None
+        self._failed = False
+
+        encoder = _select_encoder()
+        if encoder is None:
+            fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+            self._writer = cv2.VideoWriter(path, fourcc, fps, (width, height))
+            return
+
+        cmd = [
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "pipe:",
+            # yuv420p needs even dimensions; stitched widths often are not.
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", encoder, *_FFMPEG_ENCODERS[encoder],
+            "-pix_fmt", "yuv420p",
+            path,
+        ]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, frame) -> None:
+        if self._writer is not None:
+            self._writer.write(frame)
+            return
+        if self._failed:
+            return
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self._failed = True
+
+    def close(self) -> bool:
+        """Finish the file; returns False if the encoder failed."""
+        if self._writer is not None:
+            self._writer.release()
+            return True
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            self._failed = True
+        return self._proc.wait() == 0 and not self._failed
+
+
 @dataclass
 class EpisodeMedia:
     chunk_id: str
@@ -21,53 +114,80 @@ def preprocess_frame(frame, camera_id: str, preprocessing: Dict[str, FramePrepro
     cfg: Optional[FramePreprocessingConfig] = preprocessing.get(camera_id)
     if not cfg:
         return frame
+    return _apply_preprocess(frame, cfg, camera_id)
+
 
+def _apply_preprocess(frame, cfg: FramePreprocessingConfig, camera_id: str):
+    """preprocess_frame for a camera whose config was already looked up."""
     processed = frame
-    if cfg.crop:
-        x, y, w, h = cfg.crop
-        x = max(int(x), 0)
-        y = max(int(y), 0)
-        w = max(int(w), 0)
-        h = max(int(h), 0)
-        if w > 0 and h > 0:
-            processed = processed[y : y + h, x : x + w]
+    if cfg.crop_slice is not None:
+        processed = processed[cfg.crop_slice]
     if cfg.resize:
-        width, height = cfg.resize
-        processed = cv2.resize(processed, (int(width), int(height)))
+        processed = cv2.resize(processed, cfg.resize)
     if cfg.rotate_deg is not None:
         angle = cfg.rotate_deg % 360
-        rotate_flags = {
-            0: None,
-            90: cv2.ROTATE_90_CLOCKWISE,
-            180: cv2.ROTATE_180,
-            270: cv2.ROTATE_90_COUNTERCLOCKWISE,
-            -90: cv2.ROTATE_90_COUNTERCLOCKWISE,
-        }
-        if angle in rotate_flags:
-            if rotate_flags[angle] is not None:
-                processed = cv2.rotate(processed, rotate_flags[angle])
+        if angle in _ROTATE_FLAGS:
+            if _ROTATE_FLAGS[angle] is not None:
+                processed = cv2.rotate(processed, _ROTATE_FLAGS[angle])
         else:
             print(f"[WARN] Unsupported rotation angle {cfg.rotate_deg} for {camera_id}; skipping rotation.")
     return processed
 
 
-def _normalize_heights(frames):
+def _iter_sampled_frames(cap, step: int):
+    """
+    Yield every ``step``-th frame of ``cap``, starting with the first one.
+    Dropped frames are only grabbed, which skips retrieve() and its colour conversion.
+    """
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            return
+        yield frame
+        for _ in range(step - 1):
+            if not cap.grab():
+                return
+
+
+def _next_preprocessed_frame(camera_stage):
+    stream, cfg, camera_id = camera_stage
+    frame = next(stream, None)
+    if frame is None or cfg is None:
+        return frame
+    return _apply_preprocess(frame, cfg, camera_id)
+
+
+def _stitch_layout(frames) -> List[Tuple[int, int]]:
+    """Per-camera (x_offset, width) after scaling every frame to the first frame's height."""
     target_height = frames[0].shape[0]
-    normalized = []
+    layout = []
+    x_offset = 0
     for frame in frames:
+        width = frame.shape[1]
         if frame.shape[0] != target_height:
             scale = target_height / frame.shape[0]
-            new_width = int(frame.shape[1] * scale)
-            frame = cv2.resize(frame, (new_width, target_height))
-        normalized.append(frame)
-    return normalized
+            width = int(frame.shape[1] * scale)
+        layout.append((x_offset, width))
+        x_offset += width
+    return layout
+
+
+def _stitch_into(canvas, frames, layout: List[Tuple[int, int]]) -> None:
+    """Write each camera frame into its column band of ``canvas`` without temporaries."""
+    height = canvas.shape[0]
+    for frame, (x_offset, width) in zip(frames, layout):
+        region = canvas[:, x_offset : x_offset + width]
+        if frame.shape[:2] == (height, width):
+            region[...] = frame
+        else:
+            cv2.resize(frame, (width, height), dst=region)
 
 
 def _burn_timestamp(frame, frame_index: int):
-    height, width, _ = frame.shape
+    height = frame.shape[0]
     label = f"Frame: {frame_index}"
     box_height = 40
-    cv2.rectangle(frame, (0, height - box_height), (width, height), (0, 0, 0), -1)
+    frame[max(height - box_height, 0) :, :, :] = 0
     cv2.putText(
         frame,
         label,
@@ -80,6 +200,21 @@ def _burn_timestamp(frame, frame_index: int):
     return frame
 
 
+def _keep_debug_copy(src: str, dst: str) -> str:
+    """
+    Hard-link ``src`` to ``dst`` when both are on one filesystem (no bytes copied).
+    Otherwise copy; shutil uses sendfile on Linux so the data stays in the kernel.
+    """
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return "Linked"
+    except OSError:
+        shutil.copy(src, dst)
+        return "Copied"
+
+
 def preprocess_episode(
     dataset_root: str,
     chunk_id: str,
@@ -103,57 +238,65 @@ def preprocess_episode(
             print(f"[WARN] Missing video for episode {episode_id}: {path}")
             return None
 
+    # Fresh captures per episode on purpose: VideoCapture.open() on a pooled handle releases and
+    # rebuilds the demuxer and decoder anyway, so reusing handles measured no faster.
     caps = {camera: cv2.VideoCapture(path) for camera, path in camera_paths.items()}
-    for camera, cap in caps.items():
-        if not cap.isOpened():
-            print(f"[WARN] Could not open video for {camera} ({camera_paths[camera]}).")
-            return None
-
-    first_cap = next(iter(caps.values()))
-    original_fps = first_cap.get(cv2.CAP_PROP_FPS) or 1.0
-    step = max(int(original_fps / processing_cfg.target_fps), 1)
-
-    tmp_dir = "/dev/shm/gemini_VLM"
-    os.makedirs(tmp_dir, exist_ok=True)
-    output_path = os.path.join(tmp_dir, f"episode_{episode_id}.mp4")
-
-    writer = None
-    processed_frame_count = 0
-    read_frame_idx = 0
-
-    while True:
-        frames = []
+    sink: Optional[VideoSink] = None
+    finished = False
+    try:
         for camera, cap in caps.items():
-            ret, frame = cap.read()
-            if not ret:
-                frames = []
-                break
-            frames.append(preprocess_frame(frame, camera, cameras_cfg.preprocessing))
+            if not cap.isOpened():
+                print(f"[WARN] Could not open video for {camera} ({camera_paths[camera]}).")
+                return None
 
-        if not frames:
-            break
+        first_cap = next(iter(caps.values()))
+        original_fps = first_cap.get(cv2.CAP_PROP_FPS) or 1.0
+        step = max(int(original_fps / processing_cfg.target_fps), 1)
 
-        if read_frame_idx % step != 0:
-            read_frame_idx += 1
-            continue
+        tmp_dir = "/dev/shm/gemini_VLM"
+        os.makedirs(tmp_dir, exist_ok=True)
+        output_path = os.path.join(tmp_dir, f"episode_{episode_id}.mp4")
+        # Encoders truncate in place; a fresh inode keeps an earlier hard-linked debug copy intact.
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(output_path)
 
-        frames = _normalize_heights(frames)
-        stitched = np.hstack(frames)
-        stitched = _burn_timestamp(stitched, processed_frame_count + 1)
+        canvas = None
+        layout: List[Tuple[int, int]] = []
+        processed_frame_count = 0
 
-        if writer is None:
-            height, width, _ = stitched.shape
-            fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-            writer = cv2.VideoWriter(output_path, fourcc, processing_cfg.target_fps, (width, height))
+        camera_stages = [
+            (_iter_sampled_frames(cap, step), cameras_cfg.preprocessing.get(camera), camera)
+            for camera, cap in caps.items()
+        ]
+        # cv2 releases the GIL while decoding, so cameras decode concurrently.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(camera_stages)) as pool:
+            while True:
+                frames = list(pool.map(_next_preprocessed_frame, camera_stages))
+                if any(frame is None for frame in frames):
+                    break
 
-        writer.write(stitched)
-        processed_frame_count += 1
-        read_frame_idx += 1
+                if canvas is None:
+                    layout = _stitch_layout(frames)
+                    width = layout[-1][0] + layout[-1][1]
+                    canvas = np.empty((frames[0].shape[0], width, 3), dtype=frames[0].dtype)
+                    sink = VideoSink(output_path, width, canvas.shape[0], processing_cfg.target_fps)
 
-    for cap in caps.values():
-        cap.release()
-    if writer:
-        writer.release()
+                _stitch_into(canvas, frames, layout)
+                _burn_timestamp(canvas, processed_frame_count + 1)
+                sink.write(canvas)
+                processed_frame_count += 1
+        finished = True
+    finally:
+        for cap in caps.values():
+            cap.release()
+        encoded = sink.close() if sink is not None else True
+        if sink is not None and not finished:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(output_path)
+
+    if not encoded:
+        print(f"[WARN] Video encoding failed for episode {episode_id}.")
+        return None
 
     if processed_frame_count == 0:
         print(f"[WARN] No frames processed for episode {episode_id}.")
@@ -162,8 +305,8 @@ def preprocess_episode(
     if processing_cfg.debug_keep_video:
         os.makedirs(processing_cfg.debug_dir, exist_ok=True)
         debug_path = os.path.join(processing_cfg.debug_dir, f"episode_{episode_id}.mp4")
-        shutil.copy(output_path, debug_path)
-        print(f"[DEBUG] Copied debug video to {debug_path}")
+        action = _keep_debug_copy(output_path, debug_path)
+        print(f"[DEBUG] {action} debug video to {debug_path}")
 
     return EpisodeMedia(
         chunk_id=chunk_id,
@@ -1,111 +1,179 @@
 import argparse
-import glob
-import os
-import re
+import asyncio
 import concurrent.futures
-from typing import Dict, List, Optional, Tuple
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from config import CamerasConfig, EpisodesConfig, PipelineConfig, load_config, load_prompt_config
+from config import OutputConfig, PipelineConfig, load_config, load_prompt_config
+from discovery import discover_episodes, largest_first
 from gemini_client import GeminiInferenceClient
-from worker import process_episode
-
-
-def _episode_id_from_filename(path: str) -> Optional[str]:
-    match = re.search(r"episode_(\d+)\.mp4$", os.path.basename(path))
-    return match.group(1) if match else None
-
-
-def _within_range(episode_id: str, episodes_cfg: EpisodesConfig) -> bool:
-    start_ok = episodes_cfg.start_id is None or episode_id >= episodes_cfg.start_id
-    end_ok = episodes_cfg.end_id is None or episode_id <= episodes_cfg.end_id
-    return start_ok and end_ok
-
-
-def discover_episodes(
-    dataset_root: str, cameras_cfg: CamerasConfig, episodes_cfg: EpisodesConfig
-) -> List[Tuple[str, str]]:
-    videos_root = os.path.join(dataset_root, "videos")
-    chunk_dirs = sorted(d for d in glob.glob(os.path.join(videos_root, "chunk-*")) if os.path.isdir(d))
-    discovered: List[Tuple[str, str]] = []
+from preprocess import EpisodeMedia
+from worker import gemini_batch_stage_async, gemini_stage_async, preprocess_stage
+
+
+def _drop_completed(
+    episodes: Iterable[Tuple[str, str]], output_cfg: OutputConfig, counts: Dict[str, int]
+) -> Iterator[Tuple[str, str]]:
+    """Skip episodes whose JSON output already exists and is non-empty (one directory listing).
+    The number skipped is stored in ``counts["skipped"]``."""
+    try:
+        with os.scandir(output_cfg.dir) as entries:
+            existing = {entry.name: entry for entry in entries}
+    except FileNotFoundError:
+        existing = {}
+
+    skipped = 0
+    for chunk_id, episode_id in episodes:
+        entry = existing.get(output_cfg.filename_pattern.format(episode_id=episode_id))
+        if entry is not None and entry.is_file() and entry.stat().st_size > 0:
+            skipped += 1
+            counts["skipped"] = skipped
+            continue
+        yield chunk_id, episode_id
+    if skipped:
+        print(f"[INFO] Skipped {skipped} episode(s) with existing output (use --force to redo).")
 
-    for chunk_path in chunk_dirs:
-        chunk_id = os.path.basename(chunk_path)
-        per_camera_ids: List[set] = []
-        for camera in cameras_cfg.targets:
-            camera_dir = os.path.join(chunk_path, camera)
-            if not os.path.isdir(camera_dir):
-                print(f"[WARN] Camera directory missing: {camera_dir}")
-                per_camera_ids.append(set())
-                continue
-            ids = {_episode_id_from_filename(p) for p in glob.glob(os.path.join(camera_dir, "episode_*.mp4"))}
-            per_camera_ids.append({i for i in ids if i})
 
-        if not per_camera_ids:
-            continue
-        candidates = set.intersection(*per_camera_ids) if len(per_camera_ids) > 1 else per_camera_ids[0]
-        for episode_id in sorted(candidates):
-            if _within_range(episode_id, episodes_cfg):
-                discovered.append((chunk_id, episode_id))
+def run_pipeline(cfg: PipelineConfig, args):
+    client: Optional[GeminiInferenceClient] = None
+    if not args.skip_gemini:
+        try:
+            client = GeminiInferenceClient(cfg.gemini.model_name)
+        except ValueError as exc:
+            print(f"[WARN] {exc} Set GEMINI_API_KEY or use --skip-gemini. Falling back to skip.")
 
-    return discovered
+    prompt_cfg = load_prompt_config(cfg.prompt_path)
 
+    preprocess_workers = max(1, int(getattr(cfg.processing, "workers", 1)))
+    gemini_workers = max(1, int(cfg.processing.gemini_workers or preprocess_workers))
+    print(f"[INFO] Running with {preprocess_workers} preprocess / {gemini_workers} Gemini workers.")
+    if client is not None and cfg.gemini.batch_size:
+        print(f"[INFO] Sending Gemini requests as Batch API jobs of up to {cfg.gemini.batch_size} episodes.")
 
-def run_pipeline(cfg: PipelineConfig, args):
     episodes = discover_episodes(cfg.dataset.root, cfg.cameras, cfg.episodes)
+    counts = {"skipped": 0}
+    if not args.force:
+        episodes = _drop_completed(episodes, cfg.output, counts)
+    if cfg.processing.balance_by_size and cfg.cameras.targets:
+        episodes = largest_first(episodes, cfg.dataset.root, cfg.cameras.targets[0])
+    started = _run_staged(cfg, prompt_cfg, client, episodes, preprocess_workers, gemini_workers)
+    if not started and not counts["skipped"]:
+        print("[INFO] No episodes to process. Check dataset root, camera targets, and episode range.")
+
+
+def _run_staged(
+    cfg: PipelineConfig,
+    prompt_cfg,
+    client: Optional[GeminiInferenceClient],
+    episodes: Iterable[Tuple[str, str]],
+    preprocess_workers: int,
+    gemini_workers: int,
+) -> int:
+    return asyncio.run(_run_staged_async(cfg, prompt_cfg, client, episodes, preprocess_workers, gemini_workers))
+
+
+async def _run_staged_async(
+    cfg: PipelineConfig,
+    prompt_cfg,
+    client: Optional[GeminiInferenceClient],
+    episodes: Iterable[Tuple[str, str]],
+    preprocess_workers: int,
+    gemini_workers: int,
+) -> int:
+    """
+    Two-stage pipeline: preprocessing runs on a thread pool, Gemini calls run as tasks on the
+    event loop, so in-flight requests cost a coroutine rather than an OS thread each.
+    Episodes are pulled from ``episodes`` only as window slots free up. Returns how many ran.
+    With gemini.batch_size set, preprocessed episodes are grouped into Batch API jobs instead;
+    gemini_workers then bounds concurrent jobs.
+    """
+    loop = asyncio.get_running_loop()
+    batch_size = cfg.gemini.batch_size if client is not None else 0
+    gemini_slots = asyncio.Semaphore(gemini_workers)
+    # Episodes between preprocess start and Gemini finish; bounds the videos waiting in /dev/shm.
+    # In batch mode it must hold gemini_workers full jobs in flight plus the next batch filling up.
+    if batch_size:
+        window = asyncio.Semaphore(preprocess_workers + batch_size * (gemini_workers + 1))
+    else:
+        window = asyncio.Semaphore(preprocess_workers + gemini_workers * 2)
+    labeling: Set[asyncio.Task] = set()
+    batch_jobs: Set[asyncio.Task] = set()
+    batch: List[Tuple[Dict, EpisodeMedia]] = []
 
-    if not episodes:
-        print("[INFO] No episodes discovered. Check dataset root and camera targets.")
-        return
+    def _spawn(coro, tasks: Set[asyncio.Task]):
+        task = asyncio.create_task(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
 
-    prompt_cfg = load_prompt_config(cfg.prompt_path)
-    skip_gemini = args.skip_gemini
-    if not skip_gemini:
+    async def _label(chunk_id: str, episode_id: str):
         try:
-            GeminiInferenceClient(cfg.gemini.model_name)
-        except ValueError as exc:
-            print(f"[WARN] {exc}. Set GEMINI_API_KEY or use --skip-gemini. Falling back to skip.")
-            skip_gemini = True
-
-    workers = max(1, int(getattr(cfg.processing, "workers", 1)))
-
-    if workers > 1:
-        print(f"[INFO] Running with {workers} workers.")
-        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
-            futures = [
-                executor.submit(process_episode, cfg, prompt_cfg, chunk_id, episode_id, skip_gemini)
-                for chunk_id, episode_id in episodes
-            ]
-            for fut in concurrent.futures.as_completed(futures):
-                try:
-                    res = fut.result()
-                except Exception as exc:
-                    res = {"episode_id": "unknown", "status": "error", "errors": [str(exc)]}
-                _log_result(res)
-    else:
+            result, media = await loop.run_in_executor(
+                preprocess_pool, preprocess_stage, cfg, chunk_id, episode_id, client is None
+            )
+            if media is not None and batch_size:
+                batch.append((result, media))
+                if len(batch) >= batch_size:
+                    _spawn(_label_batch(batch[:]), batch_jobs)
+                    batch.clear()
+                return  # _label_batch logs the result and frees the window slot
+            if media is not None:
+                async with gemini_slots:
+                    result = await gemini_stage_async(cfg, prompt_cfg, client, result, media)
+        except Exception as exc:
+            result = _error_result(episode_id, exc)
+        window.release()
+        _log_result(result)
+
+    async def _label_batch(staged: List[Tuple[Dict, EpisodeMedia]]):
+        try:
+            async with gemini_slots:
+                results = await gemini_batch_stage_async(cfg, prompt_cfg, client, staged)
+        except Exception as exc:
+            results = [_error_result(media.episode_id, exc) for _, media in staged]
+        for result in results:
+            window.release()
+            _log_result(result)
+
+    started = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=preprocess_workers) as preprocess_pool:
         for chunk_id, episode_id in episodes:
-            res = process_episode(cfg, prompt_cfg, chunk_id, episode_id, skip_gemini)
-            _log_result(res)
+            await window.acquire()
+            _spawn(_label(chunk_id, episode_id), labeling)
+            started += 1
+        while labeling:
+            await asyncio.gather(*labeling)
+        if batch:
+            _spawn(_label_batch(batch[:]), batch_jobs)
+            batch.clear()
+        while batch_jobs:
+            await asyncio.gather(*batch_jobs)
+    return started
+
+
+def _error_result(episode_id: str, exc: Exception) -> Dict:
+    return {"episode_id": episode_id, "status": "error", "errors": [str(exc)]}
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Gemini VLM memory-aware labeling pipeline.")
     parser.add_argument("--config", default="./config/config.yaml", help="Path to pipeline YAML config.")
     parser.add_argument("--skip-gemini", action="store_true", help="Run preprocessing only, skip Gemini calls.")
+    parser.add_argument("--force", action="store_true", help="Reprocess episodes that already have a JSON output.")
     return parser.parse_args()
 
 
 def _log_result(res: Dict):
     episode_id = res.get("episode_id", "?")
     status = res.get("status", "unknown")
-    print(f"[INFO] Episode {episode_id} status: {status}")
+    lines = [f"[INFO] Episode {episode_id} status: {status}"]
     if res.get("json_path"):
-        print(f"[INFO] JSON: {res['json_path']}")
+        lines.append(f"[INFO] JSON: {res['json_path']}")
     if res.get("raw_path"):
-        print(f"[DEBUG] Raw: {res['raw_path']}")
-    for w in res.get("warnings", []):
-        print(f"[WARN] {episode_id}: {w}")
-    for e in res.get("errors", []):
-        print(f"[ERROR] {episode_id}: {e}")
+        lines.append(f"[DEBUG] Raw: {res['raw_path']}")
+    lines.extend(f"[WARN] {episode_id}: {w}" for w in res.get("warnings", []))
+    lines.extend(f"[ERROR] {episode_id}: {e}" for e in res.get("errors", []))
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 if __name__ == "__main__":
@@ -1,34 +1,32 @@
 import os
+import sys
 from google import genai
 
 API_KEY = os.environ.get("GEMINI_API_KEY")
 
 def list_my_models():
     if not API_KEY:
-        print("Error: GEMINI_API_KEY environment variable not set.")
+        print("Error: GEMINI_API_KEY environment variable not set.", file=sys.stderr)
         return
 
     client = genai.Client(api_key=API_KEY)
-    
-    print("--- Fetching Available Models ---")
+
+    # Progress and errors go to stderr so stdout stays a clean TSV table.
+    print("--- Fetching Available Models ---", file=sys.stderr)
+    rows = []
     try:
         # Pager for listing models
         for model in client.models.list():
-            # Use getattr to safely access attributes that might be missing in some SDK versions
-            methods = getattr(model, 'supported_generation_methods', [])
-            
-            # If the list is empty (attribute missing), we assume we want to see it just in case,
-            # or you can strictly filter: if "generateContent" in methods:
-            
-            # Simple filter: Only show if we know it supports generateContent OR if we can't tell.
-            if not methods or "generateContent" in methods:
-                print(f"ID: {model.name}")
-                print(f"    Display Name: {getattr(model, 'display_name', 'N/A')}")
-                print(f"    Version: {getattr(model, 'version', 'N/A')}")
-                print("-" * 30)
-                
+            # Only show models that support generateContent, or whose supported actions are unknown.
+            actions = model.supported_actions or []
+            if not actions or "generateContent" in actions:
+                rows.append((model.name, model.display_name or "N/A", model.version or "N/A"))
     except Exception as e:
-        print(f"An error occurred: {e}")
+        print(f"An error occurred: {e}", file=sys.stderr)
+
+    lines = ["name\tdisplay_name\tversion"]
+    lines.extend("\t".join(row) for row in rows)
+    sys.stdout.write("\n".join(lines) + "\n")
 
 if __name__ == "__main__":
-    list_my_models()
\ No newline at end of file
+    list_my_models()
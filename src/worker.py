@@ -1,11 +1,14 @@
 """
 Worker entry for per-episode processing.
 Responsible for: preprocess -> Gemini call -> parse/validate -> write outputs.
-Designed to be picklable and safe for multiprocessing.
+Split into preprocess_stage and gemini_stage_async so the runner can overlap them across episodes.
+Preprocessing runs on the runner's thread pool and Gemini calls on its event loop;
+both share one GeminiInferenceClient built by the runner.
 """
 
-from dataclasses import asdict
-from typing import Dict, Optional
+import contextlib
+import os
+from typing import Dict, List, Optional, Tuple
 
 from config import PipelineConfig, PromptConfig
 from gemini_client import GeminiInferenceClient, build_prompt
@@ -13,25 +16,16 @@ from parser import parse_gemini_response
 from preprocess import EpisodeMedia, preprocess_episode
 from io_utils import write_episode_output, persist_raw
 
-_CLIENT: Optional[GeminiInferenceClient] = None
 
-
-def _get_client(model_name: str) -> GeminiInferenceClient:
-    global _CLIENT
-    if _CLIENT is None:
-        _CLIENT = GeminiInferenceClient(model_name=model_name)
-    return _CLIENT
-
-
-def process_episode(
+def preprocess_stage(
     cfg: PipelineConfig,
-    prompt_cfg: PromptConfig,
     chunk_id: str,
     episode_id: str,
     skip_gemini: bool,
-) -> Dict:
+) -> Tuple[Dict, Optional[EpisodeMedia]]:
     """
-    Process a single episode. Returns a dict with status, warnings, errors, and output paths.
+    First stage: build the stitched, timestamped video for an episode.
+    Returns the result dict and the media still waiting for gemini_stage_async (None when done).
     """
     result = {
         "episode_id": episode_id,
@@ -53,25 +47,77 @@ def process_episode(
     if not media:
         result["status"] = "preprocess_failed"
         result["warnings"].append("Preprocess failed or no frames.")
-        return result
+        return result, None
 
     if skip_gemini:
         result["status"] = "skipped_gemini"
-        return result
+        return result, None
+
+    return result, media
+
 
+async def gemini_stage_async(
+    cfg: PipelineConfig,
+    prompt_cfg: PromptConfig,
+    client: GeminiInferenceClient,
+    result: Dict,
+    media: EpisodeMedia,
+) -> Dict:
+    """
+    Second stage: Gemini call -> parse/validate -> write outputs. Fills in and returns ``result``.
+    """
     prompt_text = build_prompt(prompt_cfg, max_frame_count=media.frame_count)
     try:
-        client = _get_client(cfg.gemini.model_name)
-        raw_text = client.analyze_episode(media.video_path, prompt_text)
+        raw_text = await client.analyze_episode_async(media.video_path, prompt_text)
+    except Exception as exc:
+        return _gemini_failed(result, exc)
+    finally:
+        _discard_video(media)
+    return _record_response(cfg, result, media, raw_text)
+
+
+async def gemini_batch_stage_async(
+    cfg: PipelineConfig,
+    prompt_cfg: PromptConfig,
+    client: GeminiInferenceClient,
+    staged: List[Tuple[Dict, EpisodeMedia]],
+) -> List[Dict]:
+    """
+    gemini_stage_async for several preprocessed episodes at once, through one Batch API job.
+    """
+    requests = [(media.video_path, build_prompt(prompt_cfg, max_frame_count=media.frame_count)) for _, media in staged]
+    try:
+        outputs = await client.analyze_batch_async(requests)
     except Exception as exc:
-        result["status"] = "gemini_failed"
-        result["errors"].append(f"Gemini call failed: {exc}")
-        return result
+        return [_gemini_failed(result, exc) for result, _ in staged]
+    finally:
+        for _, media in staged:
+            _discard_video(media)
+    return [
+        _gemini_failed(result, output) if isinstance(output, Exception) else _record_response(cfg, result, media, output)
+        for (result, media), output in zip(staged, outputs)
+    ]
+
+
+def _discard_video(media: EpisodeMedia) -> None:
+    """Remove the stitched tmp video once nothing needs it; a debug copy is a separate link."""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(media.video_path)
+
+
+def _gemini_failed(result: Dict, exc: Exception) -> Dict:
+    result["status"] = "gemini_failed"
+    result["errors"].append(f"Gemini call failed: {exc}")
+    return result
+
 
+def _record_response(cfg: PipelineConfig, result: Dict, media: EpisodeMedia, raw_text: str) -> Dict:
+    episode_id = media.episode_id
     parsed = parse_gemini_response(episode_id, media.frame_count, raw_text)
 
-    raw_path = persist_raw(cfg.output.dir, episode_id, raw_text)
-    result["raw_path"] = raw_path
+    # The raw text is only needed to debug a failed parse unless explicitly requested.
+    if not parsed.episode or cfg.output.always_persist_raw:
+        result["raw_path"] = persist_raw(cfg.output.dir, episode_id, raw_text)
 
     if parsed.episode:
         json_path = write_episode_output(cfg.output, episode_id, parsed.episode)